@@ -1,23 +1,52 @@
 import os
 import joblib
-import pandas as pd
-# *** FIX: Import Response explicitly from flask ***
-from flask import Flask, render_template, request, jsonify, Response 
+import numpy as np
+import orjson
+from flask import Flask, render_template, request, jsonify
+from flask.json.provider import JSONProvider
 
 # *** MLOPS INSTRUMENTATION ***
 # Import Prometheus client library
-from prometheus_client import Counter, Histogram, generate_latest, Gauge
-from prometheus_client import start_http_server, REGISTRY
+from prometheus_client import Counter, Histogram, Gauge
+from prometheus_client import start_http_server
+import queue
 import threading
 import time
+from functools import lru_cache
+from typing import Annotated, List, Literal
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError
+
+# Optional compiled inference backend; falls back to sklearn when unavailable
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 # --- Configuration & Initialization ---
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.get_json)."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Define model paths RELATIVE to the container's working directory (/app)
-MODEL_PATH = 'rfmodel_compressed_max.joblib'
+# rfmodel.onnx and rfmodel.joblib are written by export_model.py; the image ships
+# only the ONNX export, the joblib files are a sklearn fallback for local runs.
+MODEL_PATH = 'rfmodel.joblib'
+COMPRESSED_MODEL_PATH = 'rfmodel_compressed_max.joblib'
+ONNX_MODEL_PATH = 'rfmodel.onnx'
 FEATURE_PATH = 'feature.joblib'
 
+# Prometheus metrics are served on their own port, never through the Flask workers
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9090))
+
 # 1. DEFINE PROMETHEUS METRICS
 REQUEST_COUNT = Counter(
     'ml_prediction_requests_total', 
@@ -27,52 +56,306 @@ REQUEST_COUNT = Counter(
 REQUEST_LATENCY = Histogram(
     'ml_prediction_latency_seconds', 
     'Prediction latency (seconds)',
-    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # Custom buckets for latency monitoring
+    buckets=(0.025, 0.1, 0.5, 2.5) # SLO buckets bracketing p50/p95/p99; keep the series count low
+)
+BATCH_SIZE_HISTOGRAM = Histogram(
+    'ml_prediction_batch_size',
+    'Number of rows sent to MODEL.predict in a single call',
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+CACHE_REQUESTS = Counter(
+    'ml_prediction_cache_requests_total',
+    'Single-record predictions looked up in the LRU cache'
+)
+CACHE_MISSES = Counter(
+    'ml_prediction_cache_misses_total',
+    'Single-record predictions that missed the LRU cache and ran the model'
+)
+INFERENCE_BACKEND = Gauge(
+    'ml_inference_backend',
+    'Inference backend serving predictions (1 on the active backend label)',
+    ['backend'],
+    multiprocess_mode='max'
 )
 MODEL_LOADED_STATUS = Gauge(
     'ml_model_load_status', 
-    'Status of model loading (1=success, 0=failure)'
+    'Status of model loading (1=success, 0=failure)',
+    multiprocess_mode='max' # Aggregate across Gunicorn workers in multiprocess mode
 )
 
+# Helper function to open the forest in onnxruntime
+def load_onnx_session():
+    """Opens the float32 ONNX export written by export_model.py in a single-threaded session."""
+    if ort is None:
+        raise RuntimeError(f"{ONNX_MODEL_PATH} is present but onnxruntime is not installed.")
+    options = ort.SessionOptions()
+    # Latency mode: one thread per call, concurrency comes from the web workers
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(
+        ONNX_MODEL_PATH, sess_options=options, providers=['CPUExecutionProvider']
+    )
+
+# Helper function to load the sklearn forest (fallback when there is no ONNX export)
+def load_sklearn_model():
+    """Loads the pre-trained sklearn forest from joblib."""
+    if os.path.exists(MODEL_PATH):
+        # Uncompressed: loads without a decompression pass. Note that sklearn's
+        # Tree.__setstate__ copies the mapped node/value arrays into its own
+        # buffers, so memory is shared across workers by --preload copy-on-write,
+        # not by the mmap itself.
+        model = joblib.load(MODEL_PATH, mmap_mode='r')
+    else:
+        model = joblib.load(COMPRESSED_MODEL_PATH)
+    # Each Gunicorn worker is its own process; don't let joblib fork more inside it
+    model.n_jobs = 1
+    # /predict passes plain NumPy rows; drop the fitted DataFrame column names
+    # so sklearn skips its feature-name check (and its warning) on every call
+    if hasattr(model, 'feature_names_in_'):
+        del model.feature_names_in_
+    return model
+
 # Helper function to load the model and features
 def load_model_and_features():
-    """Loads the pre-trained model and feature names from joblib files."""
+    """Loads the model (ONNX export if present, sklearn forest otherwise) and the feature names."""
     try:
-        model = joblib.load(MODEL_PATH)
         feature_names = joblib.load(FEATURE_PATH)
+        if os.path.exists(ONNX_MODEL_PATH):
+            # Only one backend is held in memory. The image ships this export, so
+            # errors opening it propagate and fail startup instead of degrading
+            model, backend = load_onnx_session(), 'onnxruntime'
+        else:
+            print(f"WARNING: {ONNX_MODEL_PATH} not found (run export_model.py); serving predictions with sklearn.")
+            model, backend = load_sklearn_model(), 'sklearn'
         MODEL_LOADED_STATUS.set(1) # Set gauge to 1 on success
-        return model, feature_names
+        INFERENCE_BACKEND.labels(backend=backend).set(1)
+        return model, backend, feature_names
     except FileNotFoundError as e:
-        print(f"Error: Model file not found. Please ensure {MODEL_PATH} and {FEATURE_PATH} are copied to /app.")
+        print(f"Error: Model file not found. Please ensure {ONNX_MODEL_PATH} and {FEATURE_PATH} are copied to /app.")
         print(f"Details: {e}")
         MODEL_LOADED_STATUS.set(0) # Set gauge to 0 on failure
-        return None, None
+        return None, None, None
 
 # Load model globally when the app starts
-MODEL, FEATURE_NAMES = load_model_and_features()
+# (MODEL is the ONNX session or the sklearn forest, per MODEL_BACKEND; None if loading failed)
+MODEL, MODEL_BACKEND, FEATURE_NAMES = load_model_and_features()
 
 if MODEL is None or FEATURE_NAMES is None:
     print("WARNING: Model or features failed to load. The API will not function correctly.")
 
-# Mapping options (No changes needed, kept for reference)
+# Mapping options (also the closed set of categories accepted by /predict)
 CUT_OPTIONS = ['Ideal', 'Premium', 'Very Good', 'Good', 'Fair']
 COLOR_OPTIONS = {
     "D": "D - Colorless (Best)",
-    # ... (Rest of COLOR_OPTIONS) ...
+    "E": "E - Colorless (Near Perfect)",
+    "F": "F - Colorless (Slight Tint)",
+    "G": "G - Near Colorless",
+    "H": "H - Near Colorless (Slight Yellow)",
+    "I": "I - Near Colorless (More Tint)",
+    "J": "J - Faint Color"
 }
 CLARITY_OPTIONS = {
     "IF": "IF - Internally Flawless",
-    # ... (Rest of CLARITY_OPTIONS) ...
+    "VVS1": "VVS1 - Very Very Slightly Included (1)",
+    "VVS2": "VVS2 - Very Very Slightly Included (2)",
+    "VS1": "VS1 - Very Slightly Included (1)",
+    "VS2": "VS2 - Very Slightly Included (2)",
+    "SI1": "SI1 - Slightly Included (1)",
+    "SI2": "SI2 - Slightly Included (2)",
+    "I1": "I1 - Included (Lowest Clarity)"
 }
 
+# Precompute the feature layout once so /predict only writes into a copied array
+# instead of building a dict and a DataFrame for every request.
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES or [])}
+TEMPLATE = np.zeros(len(FEATURE_INDEX), dtype=np.float32)
+NUMERIC_FEATURES = ['carat', 'depth', 'table', 'x', 'y', 'z']
+NUMERIC_INDEX = [FEATURE_INDEX[name] for name in NUMERIC_FEATURES if name in FEATURE_INDEX]
+
+# Flat indices of each category's one-hot column; the dropped reference
+# categories have no column and are left out (their rows stay all-zero)
+CUT_IDX = {c: FEATURE_INDEX[f'cut_{c}'] for c in CUT_OPTIONS if f'cut_{c}' in FEATURE_INDEX}
+COLOR_IDX = {c: FEATURE_INDEX[f'color_{c}'] for c in COLOR_OPTIONS if f'color_{c}' in FEATURE_INDEX}
+CLARITY_IDX = {c: FEATURE_INDEX[f'clarity_{c}'] for c in CLARITY_OPTIONS if f'clarity_{c}' in FEATURE_INDEX}
+
+# Helper function to pre-encode every categorical combination
+def build_row_templates():
+    """Returns {(cut, color, clarity): row} with the one-hot slots of each combination already set."""
+    templates = {}
+    for cut in CUT_OPTIONS:
+        for color in COLOR_OPTIONS:
+            for clarity in CLARITY_OPTIONS:
+                row = TEMPLATE.copy()
+                for idx in (CUT_IDX.get(cut), COLOR_IDX.get(color), CLARITY_IDX.get(clarity)):
+                    if idx is not None:
+                        row[idx] = 1.0
+                templates[(cut, color, clarity)] = row
+    return templates
+
+# Only 5 x 7 x 8 = 280 combinations exist, so /predict reduces to a lookup + copy
+TEMPLATES = build_row_templates()
+
+# Request schema: parsed once per record, with structured errors for bad input
+def _reject_bool(value):
+    """Stops pydantic's lax mode from reading JSON true/false as 1.0/0.0."""
+    if isinstance(value, bool):
+        raise ValueError("must be a number, not a boolean")
+    return value
+
+# Finite (allow_inf_nan=False on the model), non-negative measurement
+Measurement = Annotated[float, BeforeValidator(_reject_bool), Field(ge=0)]
+
+class DiamondIn(BaseModel):
+    """One stone as accepted by /predict (form values arrive as strings and are coerced)."""
+    # NaN/inf would otherwise reach onnxruntime, which returns a price for them
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    carat: Measurement = 0.0
+    depth: Measurement = 0.0
+    table: Measurement = 0.0
+    x: Measurement = 0.0
+    y: Measurement = 0.0
+    z: Measurement = 0.0
+    cut: Literal[tuple(CUT_OPTIONS)] = 'Ideal'
+    color: Literal[tuple(COLOR_OPTIONS)] = 'D'
+    clarity: Literal[tuple(CLARITY_OPTIONS)] = 'IF'
+
+DIAMOND_BATCH = TypeAdapter(List[DiamondIn])
+
+def quantize(diamond):
+    """Returns the quantized (carat, depth, table, x, y, z, cut, color, clarity) tuple for a DiamondIn."""
+    # Every prediction runs on these rounded values, so the single-record cache
+    # and the batch path always agree on the price of the same stone
+    return (
+        round(diamond.carat, 3), round(diamond.depth, 2), round(diamond.table, 2),
+        round(diamond.x, 2), round(diamond.y, 2), round(diamond.z, 2),
+        diamond.cut, diamond.color, diamond.clarity
+    )
+
+def fill_feature_row(out, key):
+    """Writes the encoded features of one quantized key into the preallocated row `out`."""
+    # Copy the pre-encoded row and fill in the numerical values
+    out[:] = TEMPLATES[key[6:]]
+    out[NUMERIC_INDEX] = key[:6]
 
-# --- Metrics Endpoint ---
-@app.route("/metrics")
-def metrics():
-    """Exposes the Prometheus metrics endpoint (required by ServiceMonitor)."""
-    # Note: Flask runs this endpoint via Gunicorn on port 8080
-    return Response(generate_latest(REGISTRY), mimetype='text/plain')
+def parse_request_data():
+    """Returns the JSON request body parsed with orjson, or the form data for non-JSON requests."""
+    if request.is_json:
+        # orjson.JSONDecodeError propagates so /predict can report malformed JSON
+        return orjson.loads(request.get_data())
+    return request.form.to_dict()
 
+def model_predict(batch):
+    """Runs the forest on a 2-D float32 array with whichever backend was loaded."""
+    if MODEL_BACKEND == 'onnxruntime':
+        return MODEL.run(None, {'input': batch})[0].ravel()
+    return MODEL.predict(batch)
+
+# --- Server-side Micro-batching ---
+# Concurrent requests can be coalesced into a single model call, which
+# amortizes the model's per-call overhead across all rows in the batch.
+# Requests that queue up while a batch is running are picked up together by
+# the next one; BATCH_TIMEOUT_MS optionally lingers for more (off by default,
+# since it adds its full value to the latency of a lone request).
+#
+# Batching is OFF by default (BATCH_SIZE=1): a one-row ONNX predict takes
+# ~12 us, less than the handoff to the batching thread, and a worker can never
+# queue more requests than it has threads. Set BATCH_SIZE > 1 to enable it;
+# gunicorn.conf.py then sizes each worker's thread pool to BATCH_SIZE.
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 1))
+BATCH_TIMEOUT_MS = float(os.environ.get('BATCH_TIMEOUT_MS', 0))
+PREDICT_TIMEOUT_S = float(os.environ.get('PREDICT_TIMEOUT_S', 10))
+
+class PredictionError(RuntimeError):
+    """Raised when the model fails on a batch; a server fault, unlike bad input."""
+
+_batch_queue = queue.Queue()
+_batch_worker_lock = threading.Lock()
+_batch_worker_thread = None
+_batch_worker_pid = None
+
+def _collect_batch():
+    """Blocks for the first queued item, then takes whatever else is ready up to BATCH_SIZE rows."""
+    pending = [_batch_queue.get()]
+    n_rows = len(pending[0]['rows'])
+    deadline = time.monotonic() + BATCH_TIMEOUT_MS / 1000.0
+
+    while n_rows < BATCH_SIZE:
+        try:
+            item = _batch_queue.get_nowait()
+        except queue.Empty:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _batch_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        pending.append(item)
+        n_rows += len(item['rows'])
+    return pending
+
+def _batch_worker():
+    """Drains the queue into batches, predicts once per batch and scatters the results."""
+    while True:
+        pending = _collect_batch()
+        try:
+            batch = np.vstack([item['rows'] for item in pending])
+            BATCH_SIZE_HISTOGRAM.observe(len(batch))
+            predictions = model_predict(batch)
+        except Exception as e:
+            for item in pending:
+                item['error'] = e
+                item['event'].set()
+            continue
+
+        offset = 0
+        for item in pending:
+            n = len(item['rows'])
+            item['result'] = predictions[offset:offset + n]
+            offset += n
+            item['event'].set()
+
+def _ensure_batch_worker():
+    """Starts the batching thread once per process (threads do not survive a fork) and restarts it if it died."""
+    global _batch_worker_thread, _batch_worker_pid
+    if _batch_worker_pid == os.getpid() and _batch_worker_thread.is_alive():
+        return
+    with _batch_worker_lock:
+        if _batch_worker_pid != os.getpid() or not _batch_worker_thread.is_alive():
+            _batch_worker_thread = threading.Thread(target=_batch_worker, daemon=True)
+            _batch_worker_thread.start()
+            _batch_worker_pid = os.getpid()
+
+def predict_rows(rows):
+    """Queues a 2-D feature array for the batching thread and waits for its predictions."""
+    if BATCH_SIZE <= 1:
+        # Batching disabled: predict inline, without the thread handoff
+        try:
+            return model_predict(rows)
+        except Exception as e:
+            raise PredictionError(str(e)) from e
+    _ensure_batch_worker()
+    item = {'rows': rows, 'event': threading.Event(), 'result': None, 'error': None}
+    _batch_queue.put(item)
+    if not item['event'].wait(PREDICT_TIMEOUT_S):
+        raise TimeoutError(f"No prediction from the batching thread within {PREDICT_TIMEOUT_S}s.")
+    if item['error'] is not None:
+        raise PredictionError(str(item['error'])) from item['error']
+    return item['result']
+
+# --- Prediction Cache ---
+# Inputs cluster on the form's slider grid and clients retry identical payloads,
+# so single-record predictions are memoized on their quantized input vector.
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def cached_predict(key):
+    """Predicts the price for a quantized key; results are memoized per process."""
+    CACHE_MISSES.inc()
+    row = np.empty((1, len(FEATURE_INDEX)), dtype=np.float32)
+    fill_feature_row(row[0], key)
+    return float(predict_rows(row)[0])
 
 # --- Routes and API Endpoints ---
 @app.route('/', methods=['GET'])
@@ -106,50 +389,62 @@ def predict():
     
     try:
         # 1. Get data from the POST request (Robustly handling JSON or form data)
-        data = request.get_json(silent=True) or request.form
+        data = parse_request_data()
+
+        if not isinstance(data, (dict, list)):
+            raise ValueError("Request body must be a JSON object or a list of objects.")
 
         if not data:
              raise ValueError("No input data provided in the request body.")
 
-        # Extract numerical features and convert to float
-        carat = float(data.get('carat', 0.0))
-        depth = float(data.get('depth', 0.0))
-        table = float(data.get('table', 0.0))
-        x = float(data.get('x', 0.0))
-        y = float(data.get('y', 0.0))
-        z = float(data.get('z', 0.0))
-        
-        # Extract categorical features
-        cut = data.get('cut', 'Ideal')
-        color = data.get('color', 'D')
-        clarity = data.get('clarity', 'IF')
-
-        # 2. Preprocessing: Create the feature vector for the model
-        input_dict = {name: 0 for name in FEATURE_NAMES}
-
-        # Set the numerical values
-        input_dict['carat'] = carat
-        input_dict['depth'] = depth
-        input_dict['table'] = table
-        input_dict['x'] = x
-        input_dict['y'] = y
-        input_dict['z'] = z
-        
-        # Set the one-hot encoded categorical values
-        input_dict[f'cut_{cut}'] = 1
-        input_dict[f'color_{color}'] = 1
-        input_dict[f'clarity_{clarity}'] = 1
+        # A batch is either a bare JSON list or {"instances": [...]}; anything
+        # else is a single record and is wrapped into a 1-row batch
+        is_batch = isinstance(data, list) or 'instances' in data
+        if is_batch:
+            diamonds = DIAMOND_BATCH.validate_python(data if isinstance(data, list) else data['instances'])
+        else:
+            diamonds = [DiamondIn.model_validate(data)]
+
+        if not diamonds:
+            raise ValueError("No instances provided in the request body.")
+
+        if is_batch:
+            # 2. Preprocessing: Encode every record into one preallocated matrix
+            rows = np.empty((len(diamonds), len(FEATURE_INDEX)), dtype=np.float32)
+            for i, diamond in enumerate(diamonds):
+                fill_feature_row(rows[i], quantize(diamond))
+
+            # 3. Prediction (coalesced with concurrent requests by the batching thread)
+            predictions = [float(p) for p in predict_rows(rows)]
+        else:
+            # 2-3. Single records are served from the LRU cache when possible
+            CACHE_REQUESTS.inc()
+            predictions = [cached_predict(quantize(diamonds[0]))]
 
-        input_df = pd.DataFrame([input_dict], columns=FEATURE_NAMES)
-        
-        # 3. Prediction
-        prediction = MODEL.predict(input_df)[0]
-        
         # 4. Return result as a JSON response
+        results = [
+            {'predicted_price': f"${prediction:,.2f}", 'raw_price': prediction}
+            for prediction in predictions
+        ]
+        return jsonify(results if is_batch else results[0])
+
+    except TimeoutError as e:
+        print(f"Prediction Timeout: {e}")
+        return jsonify({'error': f'Prediction timed out: {e}'}), 504
+
+    except PredictionError as e:
+        print(f"Model Error: {e}")
+        return jsonify({'error': f'The model failed during prediction: {e}'}), 500
+
+    except orjson.JSONDecodeError as e:
+        return jsonify({'error': f'Malformed JSON in request body: {e}'}), 400
+
+    except ValidationError as e:
+        # Subclass of ValueError, so it must be handled before the generic case
         return jsonify({
-            'predicted_price': f"${prediction:,.2f}",
-            'raw_price': prediction 
-        })
+            'error': f'Invalid input: {e.error_count()} validation error(s).',
+            'details': orjson.loads(e.json(include_url=False))
+        }), 422
 
     except Exception as e:
         print(f"Prediction Error: {e}")
@@ -165,4 +460,6 @@ def predict():
 if __name__ == '__main__':
     # This block is for local development testing only
     # Note: In production (Kubernetes/Gunicorn), the entrypoint handles the run command.
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    # (Gunicorn starts the metrics exporter from its master, see gunicorn.conf.py)
+    start_http_server(METRICS_PORT)
+    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
@@ -0,0 +1,33 @@
+# export_model.py
+# One-off conversion, run at image build time: re-saves the max-compressed
+# forest without compression so app.py can load it with mmap_mode='r', and
+# exports an ONNX copy whose tree thresholds and leaf values are float32.
+import joblib
+
+SOURCE_PATH = 'rfmodel_compressed_max.joblib'
+TARGET_PATH = 'rfmodel.joblib'
+ONNX_PATH = 'rfmodel.onnx'
+FEATURE_PATH = 'feature.joblib'
+
+
+def convert_to_onnx(model, n_features):
+    """Converts the sklearn forest to an ONNX TreeEnsembleRegressor (float32 nodes and leaves)."""
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    return convert_sklearn(
+        model, initial_types=[('input', FloatTensorType([None, n_features]))]
+    )
+
+
+if __name__ == '__main__':
+    model = joblib.load(SOURCE_PATH)
+    joblib.dump(model, TARGET_PATH, compress=0)
+    print(f"Wrote uncompressed model to {TARGET_PATH}")
+
+    # Convert before opening the output so a failure never leaves an empty file behind
+    n_features = len(joblib.load(FEATURE_PATH))
+    onnx_bytes = convert_to_onnx(model, n_features).SerializeToString()
+    with open(ONNX_PATH, 'wb') as f:
+        f.write(onnx_bytes)
+    print(f"Wrote float32 ONNX model to {ONNX_PATH}")
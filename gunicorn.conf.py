@@ -0,0 +1,45 @@
+# gunicorn.conf.py
+# Picked up automatically by Gunicorn from the working directory (/app).
+import multiprocessing
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess, start_http_server
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9090))
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+
+# Threads bound how many requests one worker can have waiting on the batching
+# queue at once, and therefore the largest batch it can coalesce. With batching
+# off (BATCH_SIZE=1, the default) two threads are enough; when it is enabled the
+# pool defaults to BATCH_SIZE so a full batch can actually form.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', max(2, int(os.environ.get('BATCH_SIZE', 1)))))
+timeout = 30
+
+# Import app.py (and load the model) once in the master before forking, so the
+# workers share the read-only model pages copy-on-write instead of each
+# holding a private copy.
+preload_app = True
+
+
+def when_ready(server):
+    """Serves the metrics aggregated from every worker on a separate port from the master.
+
+    Returns the exporter's (server, thread) pair; Gunicorn ignores it, tests use it to shut down.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        # Outside the image (no multiprocess dir) only the master's own metrics
+        # are visible, but the exporter still comes up instead of failing startup
+        server.log.warning("PROMETHEUS_MULTIPROC_DIR is not set; worker metrics will not be aggregated")
+        registry = REGISTRY
+    return start_http_server(METRICS_PORT, registry=registry)
+
+
+def child_exit(server, worker):
+    """Marks a dead worker's metric files so its live gauges stop being reported."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
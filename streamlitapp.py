@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import joblib
-import time
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -55,6 +54,22 @@ def load_model():
 
 model, feature_names = load_model()
 
+# --- Cached Prediction ---
+@st.cache_data(max_entries=1024)
+def predict_price(carat, cut, color, clarity, depth, table, x, y, z):
+    input_dict = {name: 0 for name in feature_names}
+    input_dict['carat'] = carat
+    input_dict['depth'] = depth
+    input_dict['table'] = table
+    input_dict['x'] = x
+    input_dict['y'] = y
+    input_dict['z'] = z
+    input_dict[f'cut_{cut}'] = 1
+    input_dict[f'color_{color}'] = 1
+    input_dict[f'clarity_{clarity}'] = 1
+    input_df = pd.DataFrame([input_dict], columns=feature_names)
+    return float(model.predict(input_df)[0])
+
 # --- App Header ---
 if model is None:
     st.error("🚨 **Model files not found!**")
@@ -159,21 +174,8 @@ user_input = get_user_input()
 
 # --- Main Panel: Prediction and Results ---
 if st.sidebar.button(" Predict Price"):
-    input_dict = {name: 0 for name in feature_names}
-    input_dict['carat'] = user_input['carat']
-    input_dict['depth'] = user_input['depth']
-    input_dict['table'] = user_input['table']
-    input_dict['x'] = user_input['x']
-    input_dict['y'] = user_input['y']
-    input_dict['z'] = user_input['z']
-    input_dict[f'cut_{user_input["cut"]}'] = 1
-    input_dict[f'color_{user_input["color"]}'] = 1
-    input_dict[f'clarity_{user_input["clarity"]}'] = 1
-    input_df = pd.DataFrame([input_dict], columns=feature_names)
-
     with st.spinner('Calculating the price...'):
-        time.sleep(1)
-        prediction = model.predict(input_df)[0]
+        prediction = predict_price(**user_input)
 
     st.markdown("---")
     st.subheader("Prediction Result")
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    # Run metrics in multiprocess mode, as in the image; the variable has to be
+    # set before prometheus_client creates any metric, i.e. before app is imported.
+    # app.py also loads the model and feature files relative to the working directory.
+    with tempfile.TemporaryDirectory(prefix='prom-') as multiproc_dir, pytest.MonkeyPatch.context() as mp:
+        mp.setenv('PROMETHEUS_MULTIPROC_DIR', multiproc_dir)
+        mp.chdir(ROOT)
+        import app
+        yield app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,196 @@
+PAYLOAD = {
+    'carat': 1.0, 'cut': 'Premium', 'color': 'G', 'clarity': 'VS1',
+    'depth': 61.0, 'table': 57.0, 'x': 6.4, 'y': 6.4, 'z': 3.9,
+}
+
+
+def test_predict_increments_request_count(app_module, client):
+    counter = app_module.REQUEST_COUNT.labels(method='POST', endpoint='/predict')
+    before = counter._value.get()
+
+    response = client.post('/predict', json=PAYLOAD)
+
+    assert response.status_code == 200
+    assert counter._value.get() > before
+
+
+def test_predict_single_record(client):
+    response = client.post('/predict', json=PAYLOAD)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['raw_price'] > 0
+    assert body['predicted_price'].startswith('$')
+
+
+def test_predict_batch_list_returns_list(client):
+    response = client.post('/predict', json=[PAYLOAD, dict(PAYLOAD, cut='Fair')])
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert isinstance(body, list) and len(body) == 2
+    assert all('raw_price' in item and 'predicted_price' in item for item in body)
+
+
+def test_predict_instances_matches_single_record(client):
+    single = client.post('/predict', json=PAYLOAD).get_json()
+    response = client.post('/predict', json={'instances': [PAYLOAD]})
+
+    assert response.status_code == 200
+    assert response.get_json() == [single]
+
+
+def test_predict_form_data(client):
+    response = client.post('/predict', data={k: str(v) for k, v in PAYLOAD.items()})
+
+    assert response.status_code == 200
+    assert response.get_json()['raw_price'] > 0
+
+
+def test_predict_rejects_unknown_category(client):
+    response = client.post('/predict', json=dict(PAYLOAD, cut='Excellent'))
+
+    assert response.status_code == 422
+    body = response.get_json()
+    assert body['details'][0]['loc'] == ['cut']
+
+
+def test_predict_rejects_malformed_json(client):
+    response = client.post('/predict', data=b'{"carat": ', content_type='application/json')
+
+    assert response.status_code == 400
+    assert 'Malformed JSON' in response.get_json()['error']
+
+
+def test_predict_rejects_scalar_json(client):
+    response = client.post('/predict', json=5)
+
+    assert response.status_code == 400
+    assert 'JSON object or a list' in response.get_json()['error']
+
+
+def test_predict_cache_hit_skips_model(app_module, client):
+    payload = dict(PAYLOAD, carat=1.234)
+    first = client.post('/predict', json=payload).get_json()
+    lookups = app_module.CACHE_REQUESTS._value.get()
+    misses = app_module.CACHE_MISSES._value.get()
+
+    second = client.post('/predict', json=payload).get_json()
+
+    assert second == first
+    assert app_module.CACHE_REQUESTS._value.get() == lookups + 1
+    assert app_module.CACHE_MISSES._value.get() == misses
+
+
+def test_multiprocess_registry_exposes_request_count(client):
+    from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+    client.post('/predict', json=PAYLOAD)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    assert b'ml_prediction_requests_total' in generate_latest(registry)
+
+
+def test_metrics_exporter_serves_scrapes(client, monkeypatch):
+    import logging
+    import runpy
+    import urllib.request
+
+    # Port 0 lets the OS pick a free port atomically; read it back from the server
+    monkeypatch.setenv('METRICS_PORT', '0')
+    config = runpy.run_path('gunicorn.conf.py')
+
+    class Server:
+        log = logging.getLogger('gunicorn.error')
+
+    httpd, thread = config['when_ready'](Server())
+    try:
+        client.post('/predict', json=PAYLOAD)
+        with urllib.request.urlopen(f'http://127.0.0.1:{httpd.server_port}/metrics') as response:
+            assert response.status == 200
+            assert b'ml_prediction_requests_total' in response.read()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join(timeout=5)
+
+
+def test_predict_rejects_non_finite_numbers(client):
+    for value in ('nan', 'inf', '-inf', 'NaN'):
+        response = client.post('/predict', json=dict(PAYLOAD, carat=value))
+        assert response.status_code == 422, value
+
+    form = {k: str(v) for k, v in PAYLOAD.items()}
+    response = client.post('/predict', data=dict(form, depth='nan'))
+    assert response.status_code == 422
+
+
+def test_predict_rejects_boolean_and_negative_numbers(client):
+    assert client.post('/predict', json=dict(PAYLOAD, carat=True)).status_code == 422
+    assert client.post('/predict', json=dict(PAYLOAD, x=-1.0)).status_code == 422
+
+
+def test_single_and_batch_paths_agree_on_unrounded_input(client):
+    import random
+
+    rng = random.Random(0)
+    stones = [
+        dict(PAYLOAD, carat=rng.uniform(0.2, 3.0), depth=rng.uniform(55, 70),
+             table=rng.uniform(50, 65), x=rng.uniform(3, 9), y=rng.uniform(3, 9), z=rng.uniform(2, 6))
+        for _ in range(50)
+    ]
+
+    batch = client.post('/predict', json=stones).get_json()
+    singles = [client.post('/predict', json=stone).get_json() for stone in stones]
+
+    assert batch == singles
+
+
+def test_batching_thread_coalesces_and_scatters(app_module, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    monkeypatch.setattr(app_module, 'BATCH_SIZE', 8)
+    rows = np.stack([app_module.TEMPLATES[('Premium', 'G', 'VS1')]] * 16)
+    rows[:, app_module.NUMERIC_INDEX] = [
+        (0.5 + i / 10, 61.0, 57.0, 5.0 + i / 10, 5.0 + i / 10, 3.0) for i in range(16)
+    ]
+    expected = app_module.model_predict(rows)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: app_module.predict_rows(rows[i:i + 1]), range(16)))
+
+    assert np.allclose(np.concatenate(results), expected)
+
+
+def test_predict_model_failure_is_500(app_module, client, monkeypatch):
+    def broken(batch):
+        raise RuntimeError('model exploded')
+
+    monkeypatch.setattr(app_module, 'model_predict', broken)
+    response = client.post('/predict', json=dict(PAYLOAD, carat=2.345))
+
+    assert response.status_code == 500
+    assert 'model exploded' in response.get_json()['error']
+
+
+def test_predict_batching_timeout_is_504(app_module, client, monkeypatch):
+    import threading
+
+    release = threading.Event()
+
+    def stuck(batch):
+        release.wait(5)
+        raise RuntimeError('too late')
+
+    monkeypatch.setattr(app_module, 'BATCH_SIZE', 8)
+    monkeypatch.setattr(app_module, 'PREDICT_TIMEOUT_S', 0.05)
+    monkeypatch.setattr(app_module, 'model_predict', stuck)
+    try:
+        response = client.post('/predict', json=dict(PAYLOAD, carat=2.456))
+    finally:
+        release.set()
+
+    assert response.status_code == 504